@@ -1,53 +1,291 @@
 #!/usr/bin/env python3
 import subprocess
+import selectors
 import signal
+import socket
 import sys
 import os
 import time
-from datetime import datetime
 import threading
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
 import yaml
 
+try:
+    # 优先使用 libyaml 提供的 C 解析器
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader
+
 # 项目根目录
 PROJECT_ROOT = "/home/leon/GoCode/go-gateway"
 CONFIG_FILE = os.path.join(PROJECT_ROOT, "configs/config.yaml")
+# 环境变量快照：os.environ 每次遍历都要逐项编解码，启动子进程时基于普通 dict 复制更快
+BASE_ENV = dict(os.environ)
+# 每个服务独立成进程组。process_group 不依赖 preexec_fn，CPython 仍可走 vfork 快速路径；
+# Python 3.11 之前没有该参数，退回 start_new_session（同样会新建进程组）
+SPAWN_GROUP = {"process_group": 0} if sys.version_info >= (3, 11) else {"start_new_session": True}
+
+
+@dataclass(slots=True, frozen=True)
+class ServiceDef:
+    """从配置解析出的服务定义，目录在加载时一次性校验"""
+    name: str
+    rel_path: str
+    port: int
+
+
+@dataclass(slots=True)
+class ServiceInfo:
+    """已启动服务的运行信息"""
+    proc: subprocess.Popen
+    name: str
+    port: int
+    rel_path: str
+    name_prefix: bytes  # 输出行前缀 b"[服务名] "，启动时编码一次
+    pending: bytearray = field(default_factory=bytearray)  # 尚未读到换行符的输出
+
+
+processes: dict[int, ServiceInfo] = {}  # 按 PID 索引的运行中服务
+# 所有已启动服务的进程组（组 ID 即服务主进程 PID）。主进程退出后组内仍可能残留
+# go run 编译出的服务二进制，因此单独记录，不随 processes 删除
+service_groups: dict[int, str] = {}
+processes_lock = threading.Lock()  # 并发启动时保护 processes 与 service_groups
+selector = selectors.DefaultSelector()  # 在单个事件循环中复用所有服务的输出（Linux 上为 epoll）
+READ_CHUNK = 1 << 16  # 每次从管道读取的最大字节数
+wakeup_fd = None  # 信号 wakeup 管道的读端，由 setup_signals() 创建
+
+
+_ts_cache = (0, b"")  # (秒级时间, 对应的时间戳前缀)
+
+
+def timestamp():
+    """返回当前时间戳前缀（字节），同一秒内复用缓存"""
+    global _ts_cache
+    now = int(time.time())
+    if now != _ts_cache[0]:
+        _ts_cache = (now, time.strftime("[%Y-%m-%d %H:%M:%S] ", time.localtime(now)).encode())
+    return _ts_cache[1]
 
-processes = []  # 存储进程信息：(进程对象, 服务名, 端口, 相对路径)
+
+def write_stdout(data):
+    """直接写标准输出的文件描述符，每批数据通常只需一次 write 系统调用"""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(1, view):]
 
 
 def log(message):
     """带时间戳的日志输出"""
-    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}")
+    write_stdout(timestamp() + message.encode() + b"\n")
+
+
+def port_is_free(port):
+    """通过 bind 探测端口是否空闲，无需创建子进程"""
+    # 与 Go 服务的 ":PORT" 一致绑定通配地址：IPv4 通配地址与任意 IPv4 地址上的监听冲突，
+    # 另以 IPV6_V6ONLY 探测仅监听 IPv6 的套接字
+    probes = [(socket.AF_INET, "")]
+    if socket.has_ipv6:
+        probes.append((socket.AF_INET6, "::"))
+
+    for family, host in probes:
+        try:
+            s = socket.socket(family, socket.SOCK_STREAM)
+        except OSError:
+            # 内核未启用 IPv6
+            continue
+        try:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 0)
+            if family == socket.AF_INET6:
+                s.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+            s.bind((host, port))
+        except OSError:
+            # EADDRINUSE 等错误一律视为被占用，交由后续查找逻辑处理
+            return False
+        finally:
+            s.close()
+    return True
+
+
+def _read_proc_file(path):
+    """以字节形式完整读取 /proc 下的文件"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        chunks = []
+        while chunk := os.read(fd, 1 << 20):
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+    return b"".join(chunks)
+
+
+def _find_listen_pids_proc(port):
+    """解析 /proc/net/tcp[6]，返回监听指定端口的进程 PID 集合（仅 Linux）"""
+    inodes = set()
+    # 各行格式固定为 "sl: 本地地址:端口 远端地址:端口 状态 ..."，地址为定长十六进制。
+    # 目标端口只编码一次（如 8080 -> b":1F90 "），在整个缓冲区上做子串查找；
+    # 命中后以行首 "sl:" 的冒号为基准，校验其位于本地端口列并检查状态列
+    needle = b":%04X " % port
+    for table, addr_len in (("/proc/net/tcp", 8), ("/proc/net/tcp6", 32)):
+        try:
+            data = _read_proc_file(table)
+        except FileNotFoundError:
+            # 内核未启用 IPv6 时不存在 tcp6
+            continue
+
+        port_off = 2 + addr_len
+        state_off = 2 + 2 * (addr_len + 6)
+        hit = data.find(needle, data.find(b"\n") + 1)  # 跳过表头
+        while hit >= 0:
+            start = data.rfind(b"\n", 0, hit) + 1
+            end = data.find(b"\n", hit)
+            if end < 0:
+                end = len(data)
+            colon = data.find(b":", start, end)
+            st = colon + state_off
+            # 状态 0A 即 TCP_LISTEN
+            if hit == colon + port_off and data[st:st + 2] == b"0A":
+                inodes.add(data[start:end].split()[9].decode())
+            hit = data.find(needle, end)
+
+    if not inodes:
+        return set()
+
+    targets = {f"socket:[{inode}]" for inode in inodes}
+    pids = set()
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        fd_dir = f"/proc/{entry.name}/fd"
+        try:
+            for fd in os.listdir(fd_dir):
+                if os.readlink(f"{fd_dir}/{fd}") in targets:
+                    pids.add(int(entry.name))
+                    break
+        except (PermissionError, FileNotFoundError, ProcessLookupError):
+            # 无权限查看或进程已在扫描过程中退出
+            continue
+    return pids
+
+
+def _find_listen_pids_lsof(port):
+    """通过 lsof 查找监听指定端口的进程 PID 集合（macOS 等无 /proc 的平台）"""
+    try:
+        # 直接执行 lsof 而非经由 shell；-n -P 跳过 DNS 与服务名解析
+        output = subprocess.check_output(
+            ["lsof", "-t", f"-iTCP:{port}", "-sTCP:LISTEN", "-nP"], stderr=subprocess.DEVNULL, text=True
+        )
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        # lsof 不存在或没有进程在监听该端口
+        return set()
+    return {int(pid_str) for pid_str in output.split()}
+
+
+HAS_PROC = sys.platform.startswith("linux") and os.path.exists("/proc/net/tcp")
+
+# 查找端口监听进程的实现在导入时按平台选定一次：有 /proc 时直接解析，否则退回 lsof
+if HAS_PROC:
+    find_listen_pids = _find_listen_pids_proc
+else:
+    find_listen_pids = _find_listen_pids_lsof
+
+
+def alive(pid):
+    """判断进程是否仍然存在（信号 0 只做检查，不实际发送）"""
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # 进程存在但属于其他用户
+        return True
+
+
+def alive_groups(pgids):
+    """返回仍有存活进程的进程组 ID 集合（Linux 上不计入僵尸进程）"""
+    candidates = {pgid for pgid in pgids if alive(-pgid)}
+    if not candidates or not HAS_PROC:
+        return candidates
+
+    # 被 PID 1 收养却未被回收的僵尸进程仍属于原进程组，signal 0 会误判为存活
+    live = set()
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat", "rb") as f:
+                stat = f.read()
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+        # 进程名可能包含空格或括号，从最后一个 ")" 之后依次为 state ppid pgrp
+        fields = stat[stat.rfind(b")") + 2:].split()
+        pgrp = int(fields[2])
+        if pgrp in candidates and fields[0] != b"Z":
+            live.add(pgrp)
+    return live
 
 
 def free_port(port):
     """安全释放端口：仅杀死 LISTEN 状态的 TCP 进程"""
+    if port_is_free(port):
+        return
+
     try:
-        # 使用 fuser 命令，更简洁可靠
-        subprocess.run(f"fuser -k -n tcp {port}", shell=True, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        pids = find_listen_pids(port)
+
+        if not pids:
+            return
+
+        for pid in pids:
+            log(f"[INFO] 端口 {port} 被进程 {pid} 占用，发送终止信号")
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        time.sleep(0.5)
+        for pid in pids:
+            if alive(pid):
+                log(f"[INFO] 进程 {pid} 未能退出，强制杀死")
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
         log(f"[INFO] 确保端口 {port} 已被释放。")
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        # fuser 命令不存在或没有进程在监听该端口，都可忽略
-        pass
     except Exception as e:
         log(f"[ERROR] 释放端口 {port} 失败：{str(e)}")
 
 
-def stream_output(proc, service_name):
-    """实时打印服务输出"""
-    for line in iter(proc.stdout.readline, ''):
-        if line:
-            log(f"[{service_name}] {line.strip()}")
-    proc.stdout.close()
-
-
-def start_service(service_name, rel_path, port):
+def read_output(fd, info):
+    """读取服务的可读输出并按行打印，返回 False 表示输出已结束"""
+    pending = info.pending
+    chunk = os.read(fd, READ_CHUNK)
+    if chunk:
+        pending += chunk
+    elif pending:
+        pending += b"\n"  # 输出已结束，补全最后不完整的一行
+    else:
+        return False
+
+    # 同一批数据共用一个前缀，直接以字节拼接，避免逐行解码与格式化
+    prefix = timestamp() + info.name_prefix
+    out = bytearray()
+    while (i := pending.find(b"\n")) >= 0:
+        out += prefix
+        out += pending[:i].rstrip(b"\r")  # 只去掉行尾的 \r，保留行首缩进
+        out += b"\n"
+        del pending[:i + 1]  # 末尾不完整的行留待下次读取
+
+    if out:
+        write_stdout(out)
+    return bool(chunk)
+
+
+def start_service(service):
     """启动单个服务，并捕获输出日志"""
-    abs_path = os.path.abspath(os.path.join(PROJECT_ROOT, rel_path))
-
-    if not os.path.exists(abs_path):
-        log(f"[ERROR] 服务目录不存在：{abs_path}")
-        return None
+    service_name, rel_path, port = service.name, service.rel_path, service.port
 
     free_port(port)
 
@@ -57,57 +295,164 @@ def start_service(service_name, rel_path, port):
         cwd=PROJECT_ROOT,
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
-        text=True,
-        env={**os.environ, "PORT": f"{port}"} # PORT 环境变量通常不带冒号
+        # 服务并发启动，每个子进程需要独立的 env；PORT 环境变量通常不带冒号
+        env={**BASE_ENV, "PORT": str(port)},
+        **SPAWN_GROUP,
     )
 
-    threading.Thread(target=stream_output, args=(proc, service_name), daemon=True).start()
-
-    processes.append((proc, service_name, port, rel_path))
+    # 输出管道设为非阻塞并立即交给事件循环，由单个线程统一读取所有服务的输出
+    os.set_blocking(proc.stdout.fileno(), False)
+    with processes_lock:
+        info = ServiceInfo(proc, service_name, port, rel_path, f"[{service_name}] ".encode())
+        processes[proc.pid] = info
+        service_groups[proc.pid] = service_name
+        selector.register(proc.stdout, selectors.EVENT_READ, info)
     return proc
 
 
+def reap_children():
+    """回收所有已退出的子进程，返回其中服务主进程对应的 ServiceInfo 列表"""
+    exited = []
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return exited
+        if pid == 0:
+            return exited
+
+        info = processes.pop(pid, None)
+        if info is not None:
+            # 已由此处回收，同步退出码以便 Popen.poll() 仍能返回正确结果
+            info.proc.returncode = os.waitstatus_to_exitcode(status)
+            exited.append(info)
+
+
+def setup_signals():
+    """将 SIGCHLD/SIGINT/SIGTERM 接入事件循环"""
+    global wakeup_fd
+    # 信号编号经由 wakeup fd 写入管道，与服务输出一起由 selector 统一等待
+    wakeup_fd, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_fd, False)
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    selector.register(wakeup_fd, selectors.EVENT_READ)
+    # 只有安装了 Python 层处理函数的信号才会写入 wakeup fd，实际处理放在事件循环中进行。
+    # 启动阶段收到的 Ctrl+C 会在进入 monitor_services 后立即得到处理
+    for sig in (signal.SIGCHLD, signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda signum, frame: None)
+
+
+def poll_events(timeout=None):
+    """等待一轮事件：转发就绪的服务输出，返回期间收到的信号编号"""
+    signums = b""
+    for key, _ in selector.select(timeout):
+        if key.fd == wakeup_fd:
+            signums += os.read(wakeup_fd, 512)
+            continue
+
+        if not read_output(key.fd, key.data):
+            selector.unregister(key.fileobj)
+            key.fileobj.close()
+    return signums
+
+
+def drain_output(timeout=1.0):
+    """转发各服务管道中剩余的输出，直至全部读到 EOF（管道已注销）或超时"""
+    deadline = time.monotonic() + timeout
+    while any(key.fd != wakeup_fd for key in selector.get_map().values()):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        poll_events(remaining)
+
 
 def monitor_services():
-    """监控服务运行状态"""
+    """在单个事件循环中转发所有服务输出，并处理 SIGCHLD/SIGINT/SIGTERM"""
+    # 首次检查时顺带回收在进入事件循环之前就已退出的子进程；先读取一轮已就绪的输出，
+    # 以免启动即失败的服务（如 go.mod 版本不符）的错误信息被丢弃
+    signums = poll_events(0) + bytes([signal.SIGCHLD])
     while True:
-        time.sleep(1)
-        # 从列表副本进行迭代以安全地删除元素
-        for proc_info in processes[:]:
-            proc, service_name, port, rel_path = proc_info
-            if proc.poll() is not None:
-                log(f"\n[ERROR] 服务 {service_name}（端口 {port}）异常退出！退出码：{proc.returncode}")
-                processes.remove(proc_info)
+        for signum in signums:
+            if signum != signal.SIGCHLD:
+                stop_services(signum, None)
+
+            exited = reap_children()
+            for info in exited:
+                log(f"\n[ERROR] 服务 {info.name}（端口 {info.port}）异常退出！退出码：{info.proc.returncode}")
                 # 可以选择在这里添加服务重启逻辑
-                if not processes:
-                    log("[INFO] 所有服务已退出，脚本终止")
-                    sys.exit(1)
+            if exited:
+                prune_service_groups()
+            if not processes:
+                # 主进程虽已退出，go run 派生的服务二进制可能仍占用端口；
+                # 杀死残留进程后管道才会关闭，随后转发剩余输出
+                kill_service_groups()
+                drain_output()
+                log("[INFO] 所有服务已退出，脚本终止")
+                sys.exit(1)
+
+        signums = poll_events()
+
+
+def prune_service_groups():
+    """移除已无存活进程的进程组并返回仍存活的组 ID 集合。
+
+    组内进程全部退出后，内核可能把同一 PGID 分配给无关的进程组，
+    因此只保留确知仍有本脚本进程的组，避免误发信号
+    """
+    live = alive_groups(service_groups)
+    for pgid in [pgid for pgid in service_groups if pgid not in live]:
+        del service_groups[pgid]
+    return live
+
+
+def kill_service_groups():
+    """强制杀死仍有进程存活的服务进程组"""
+    # 先回收已退出的主进程，避免因僵尸进程误判
+    reap_children()
+    prune_service_groups()
+    for pgid, service_name in service_groups.items():
+        log(f"[STOP] 进程组 {service_name}（PGID={pgid}）未能优雅退出，强制杀死。")
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
 
 
 def stop_services(sig, frame):
     """优雅停止所有服务"""
     log("\n[STOP] 收到停止信号，正在关闭所有服务...")
-    # 反向停止，先停网关
-    for proc, service_name, port, _ in reversed(processes):
-        if proc.poll() is None:
-            try:
-                log(f"[STOP] 发送终止信号到 {service_name}（PID={proc.pid}）")
-                # Go 程序通常能很好地处理 SIGINT (Ctrl+C)
-                proc.send_signal(signal.SIGINT)
-            except Exception as e:
-                log(f"[ERROR] 发送停止信号到 {service_name} 失败：{str(e)}")
-
-    # 等待所有进程终止
+    # 只向确知仍有本脚本进程的组发送信号
+    reap_children()
+    prune_service_groups()
+    # 反向停止，先停网关；信号发给整个进程组，go run 派生的服务二进制也能收到
+    for pgid, service_name in reversed(service_groups.items()):
+        try:
+            log(f"[STOP] 发送终止信号到 {service_name}（PGID={pgid}）")
+            # Go 程序通常能很好地处理 SIGINT (Ctrl+C)；服务位于独立进程组，
+            # 终端的 Ctrl+C 不会直接到达，需转发给整个组
+            os.killpg(pgid, signal.SIGINT)
+        except Exception as e:
+            log(f"[ERROR] 发送停止信号到 {service_name} 失败：{str(e)}")
+
+    # 等待所有进程终止：主进程仅在收到 SIGCHLD 时回收，processes 为空即全部退出；
+    # 期间继续转发服务输出
     shutdown_timeout = 10  # 秒
-    start_time = time.time()
-    while any(p[0].poll() is None for p in processes) and time.time() - start_time < shutdown_timeout:
-        time.sleep(0.5)
-    
-    # 强制杀死仍在运行的进程
-    for proc, service_name, port, _ in processes:
-        if proc.poll() is None:
-            log(f"[STOP] 进程 {service_name}（PID={proc.pid}）未能优雅退出，强制杀死。")
-            proc.kill()
+    deadline = time.monotonic() + shutdown_timeout
+    while (remaining := deadline - time.monotonic()) > 0:
+        if processes:
+            if signal.SIGCHLD in poll_events(remaining):
+                reap_children()
+        elif service_groups:
+            # 主进程均已退出但组内仍有服务二进制在收尾。它们不是本进程的子进程，
+            # 退出时不会产生 SIGCHLD，只能短间隔轮询
+            poll_events(min(remaining, 0.2))
+        else:
+            break
+        prune_service_groups()
+
+    kill_service_groups()
+    drain_output()
 
     log("[STOP] 所有服务已关闭")
     sys.exit(0)
@@ -115,17 +460,17 @@ def stop_services(sig, frame):
 
 def load_services_from_config():
     """从 config.yaml 读取服务和端口，包括 api-gateway"""
-    with open(CONFIG_FILE, "r") as f:
-        config = yaml.safe_load(f)
+    with open(CONFIG_FILE, "rb") as f:
+        config = yaml.load(f.read(), Loader=_Loader)
 
-    service_defs = []
+    entries = []
 
     # 1️⃣ 读取网关服务
     server_port_str = config.get("server", {}).get("port")
     if server_port_str:
         port = int(server_port_str.lstrip(":"))
         rel_path = "./cmd/api-gateway"
-        service_defs.append(("api-gateway", rel_path, port))
+        entries.append(("api-gateway", rel_path, port))
 
     # 2️⃣ 读取其他微服务
     # config.yaml 中的 services 是一个字典，不是列表
@@ -137,21 +482,34 @@ def load_services_from_config():
             url = instance["url"]  # e.g. http://localhost:8085
             port = int(url.split(":")[-1])
             rel_path = f"./cmd/{service_name}"
-            service_defs.append((f"{service_name}-{port}", rel_path, port))
-            
+            entries.append((f"{service_name}-{port}", rel_path, port))
+
+    # 3️⃣ 计算绝对路径并校验目录，同一目录只检查一次
+    service_defs = []
+    dir_exists = {}
+    for service_name, rel_path, port in entries:
+        abs_path = os.path.normpath(os.path.join(PROJECT_ROOT, rel_path))
+        if abs_path not in dir_exists:
+            dir_exists[abs_path] = os.path.isdir(abs_path)
+        if not dir_exists[abs_path]:
+            log(f"[ERROR] 服务目录不存在：{abs_path}")
+            continue
+        service_defs.append(ServiceDef(service_name, rel_path, port))
+
     return service_defs
 
 
 
 if __name__ == "__main__":
-    signal.signal(signal.SIGINT, stop_services)
-    signal.signal(signal.SIGTERM, stop_services)
-    
+    setup_signals()
+
     try:
         services = load_services_from_config()
 
-        for service_name, rel_path, port in services:
-            start_service(service_name, rel_path, port)
+        # 各服务的端口释放与进程创建互不依赖，并发执行以缩短启动时间
+        if services:
+            with ThreadPoolExecutor(max_workers=len(services)) as executor:
+                list(executor.map(start_service, services))
 
         if not processes:
             log("[ERROR] 所有服务启动失败，脚本终止")